@@ -1,72 +1,125 @@
 import uuid
 import os
 import errno
+import stat
+import re
+import hashlib
+import mmap
 from hashlib import sha256
 from pathlib import Path
 from fastcore.basics import AttrDict, patch
 from fastcore.foundation import L
-from fnmatch import fnmatch
+from fnmatch import translate
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 # Xattr helpers
-def _get_xattr(path, key, default=None):
-    """Get HyFS xattr value, return default if not found"""
+_XATTR_KEYS = {k: f'user.hyfs.{k}'.encode() for k in ('ctime', 'uuid', 'cid')}  # Prebuilt hot keys, others formatted on demand
+_XATTR_UNSUPPORTED = set()  # st_dev of filesystems that reported ENOTSUP
+
+def _xattr_failed(path, err, dev=None):
+    """Remember the device of `path` if `err` says it has no xattr support"""
+    if err.errno not in (errno.ENOTSUP, errno.EOPNOTSUPP):
+        return  # e.g. ENODATA: attribute simply not set
     try:
-        return os.getxattr(str(path), f'user.hyfs.{key}').decode()
+        _XATTR_UNSUPPORTED.add(os.stat(path).st_dev if dev is None else dev)
     except OSError:
+        pass
+
+def _get_xattr(path, key, default=None, dev=None):
+    """Get HyFS xattr value, return default if not found. `path` may be str, bytes or Path.
+    Pass the file's `dev` (st_dev) to skip the syscall on filesystems known to lack xattr support."""
+    if dev in _XATTR_UNSUPPORTED:
+        return default
+    try:
+        return os.getxattr(path, _XATTR_KEYS.get(key) or f'user.hyfs.{key}'.encode()).decode()
+    except OSError as e:
+        _xattr_failed(path, e, dev)
         return default
 
-def _set_xattr(path, key, value):
-    """Set HyFS xattr value, return True on success"""
+def _set_xattr(path, key, value, dev=None):
+    """Set HyFS xattr value, return True on success. `path` may be str, bytes or Path"""
+    if dev in _XATTR_UNSUPPORTED:
+        return False
     try:
-        os.setxattr(str(path), f'user.hyfs.{key}', str(value).encode())
+        os.setxattr(path, _XATTR_KEYS.get(key) or f'user.hyfs.{key}'.encode(), str(value).encode())
         return True
-    except OSError:
+    except OSError as e:
+        _xattr_failed(path, e, dev)
         return False
 
-def _ensure_xattr(path, key, compute_fn):
-    """Get xattr value, computing and storing if missing. Returns (value, stored_successfully)"""
-    value = _get_xattr(path, key)
-    if value is not None:
-        return value, True
-    
-    value = compute_fn()
-    stored = _set_xattr(path, key, value)
-    return value, stored
+def _read_all_hyfs_xattrs(path, dev=None):
+    """Read every `user.hyfs.*` xattr of `path` as {key: value}. One listxattr, then only the keys present"""
+    if dev in _XATTR_UNSUPPORTED:
+        return {}
+    try:
+        names = [n for n in os.listxattr(path) if n.startswith('user.hyfs.')]
+    except OSError as e:
+        _xattr_failed(path, e, dev)
+        return {}
+    # Read keys independently: one unreadable key (removed since listing, foreign non-UTF-8
+    # value) must not hide the others, or a lost `uuid` would get regenerated
+    xattrs = {}
+    for n in names:
+        try:
+            xattrs[n[len('user.hyfs.'):]] = os.getxattr(path, n).decode()
+        except (OSError, UnicodeDecodeError):
+            pass
+    return xattrs
+
+# Glob matching
+def _glob_matcher(pattern):
+    """Compile glob `pattern` once into a name predicate (case-sensitive, like fnmatch on POSIX)"""
+    # Fast path for '*.ext': plain suffix test, no regex engine
+    if pattern.startswith('*.') and not any(c in pattern[1:] for c in '*?['):
+        suffix = pattern[1:]
+        return lambda name: name.endswith(suffix)
+    match = re.compile(translate(pattern)).match
+    return lambda name: match(name) is not None
 
 class FSNode(AttrDict):
-    def __getattribute__(self, key):
-        cls = object.__getattribute__(self, '__class__')
-        if key in cls.__dict__ and isinstance(cls.__dict__[key], property):
-            return cls.__dict__[key].fget(self)
-        return super().__getattribute__(key)
+    # AttrDict only falls back to dict keys in `__getattr__` (on misses), so class
+    # properties like `cid` resolve through the normal descriptor protocol
+    pass
+
+def _node_name(node, default=None):
+    """Name of a node: cached `name` (set by `add_node`), else derived from `path`"""
+    return node.get('name') or (node.path.name if 'path' in node else default)
 
 class HyFS:
     def __init__(self):
         self.nodes = {}  # eid -> FSNode
-        self.path_index = {}  # path -> eid
+        self.path_index = {}  # path str -> eid
         self.children_index = defaultdict(set)  # parent_eid -> {child_eids}
         self.tags = defaultdict(set)  # tag_name -> {eid, ...}
         self.eid_tags = defaultdict(set)  # eid -> {tag_name, ...}
-        self.relations = defaultdict(lambda: defaultdict(set))  # eid -> {rel_type -> {eid, ...}}
+        self.relations = defaultdict(lambda: defaultdict(set))  # rel_type -> {eid -> {eid, ...}}
 
     
-    def add_node(self, path, eid=None, **metadata):
-        """Add a node to the flat storage"""
+    def add_node(self, path, eid=None, is_dir=None, st=None, **metadata):
+        """Add a node to the flat storage (pass `is_dir`/`st` stat_result when known to skip stats)"""
         if eid is None:
-            eid = _compute_eid(path)
+            eid = _compute_eid(path, st)
+        if is_dir is None:
+            is_dir = stat.S_ISDIR(st.st_mode) if st is not None else path.is_dir()
+        # Index by plain str: hashes in C, unlike Path.__hash__
+        key = os.fspath(path)
+        parent_key = os.fspath(path.parent)
+        # Resolve parent first (a filesystem root is its own parent)
+        parent_eid = self.path_index.get(parent_key) if parent_key != key else None
         node = FSNode(
             path=path,
+            path_str=key,
+            name=path.name,  # Cached: Path.name re-derives it on every access
             eid=eid,
-            type='dir' if path.is_dir() else 'file',
+            type='dir' if is_dir else 'file',
+            parent_eid=parent_eid,
             **metadata
         )
         self.nodes[eid] = node
-        self.path_index[path] = eid
+        self.path_index[key] = eid
         
         # Update children index
-        parent_path = path.parent
-        parent_eid = self.path_index.get(parent_path)
         if parent_eid:
             self.children_index[parent_eid].add(eid)
         
@@ -78,19 +131,17 @@ class HyFS:
     
     def find_by_path(self, path):
         """Find node by path (O(1) with index)"""
-        path = Path(path)
-        eid = self.path_index.get(path)
+        key = path if isinstance(path, str) else os.fspath(path)
+        eid = self.path_index.get(key)
+        if eid is None and isinstance(path, str):
+            eid = self.path_index.get(os.fspath(Path(path)))  # Retry normalized ('a//b/' -> 'a/b')
         return self.nodes.get(eid) if eid else None
     
     def tree(self, root_path=None):
         """Build hierarchical tree view from flat storage"""
         if root_path is None:
             # Find root (node with no parent in our set)
-            roots = []
-            for node in self.nodes.values():
-                if not any(node.path.is_relative_to(other.path) and node.path != other.path 
-                          for other in self.nodes.values()):
-                    roots.append(node)
+            roots = [node for node in self.nodes.values() if node.parent_eid is None]
             if len(roots) == 1:
                 root_path = roots[0].path
             else:
@@ -105,27 +156,28 @@ class HyFS:
         return self._build_tree_node(root_node)
     
     def _build_tree_node(self, node):
-        """Recursively build tree structure for a node (O(n) with children index)"""
-        tree_node = FSNode(node)  # Copy node data
+        """Build tree structure for a node (O(n) with children index, iterative so depth is unbounded)"""
+        root = FSNode(node)  # Copy node data, canonical nodes stay untouched
+        stack = [root]
+        while stack:
+            tree_node = stack.pop()
+            if tree_node.type == 'dir':
+                # Use children index for O(1) lookup, build the children list in one go
+                children = [FSNode(self.nodes[eid]) for eid in self.children_index.get(tree_node.eid, ())]
+                tree_node['children'] = children
+                stack.extend(children)
         
-        if node.type == 'dir':
-            # Use children index for O(1) lookup
-            child_eids = self.children_index.get(node.eid, set())
-            children = []
-            for child_eid in child_eids:
-                child_node = self.nodes[child_eid]
-                children.append(self._build_tree_node(child_node))
-            tree_node['children'] = children
-        
-        return tree_node
+        return root
 
     def filter(self, pred):
         """Filter nodes by predicate, returns flat list"""
+        # L wraps a list as-is (no second pass/copy), so build the list once here
         return L([node for node in self.nodes.values() if pred(node)])
     
     def find(self, pattern):
         """Find nodes matching glob pattern"""
-        return self.filter(lambda n: fnmatch(n.path.name, pattern))
+        match = _glob_matcher(pattern)
+        return self.filter(lambda n: match(_node_name(n)))
 
     def __repr__(self):
         n_files = sum(1 for n in self.nodes.values() if n.type == 'file')
@@ -133,13 +185,33 @@ class HyFS:
         n_tags = len(self.tags)
         return f"HyFS(📄 {n_files} files, 📁 {n_dirs} dirs, 🏷️  {n_tags} tags)"
 
-def _compute_eid(path):
-    """Compute stable UUID for a path. Uses xattr if available, else deterministic hash from creation time."""
+def _compute_eid(path, st=None, xattrs=None):
+    """Compute stable UUID for a path. Uses xattr if available, else deterministic hash from creation time.
+    Pass `st` (the path's stat_result) when already known: the path is then stat'ed at most once.
+    Pass `xattrs` (from `_read_all_hyfs_xattrs`) when already read."""
+    fpath = os.fsencode(path)  # Encode once, reused by every xattr call
+    def _stat():
+        nonlocal st
+        if st is None:
+            st = os.stat(fpath)
+        return st
+    
+    # Use the device when a stat is at hand; once a filesystem without xattr support has been
+    # seen, stat up front so calls on such devices short-circuit (the hash fallback needs it anyway)
+    dev = _stat().st_dev if st is not None or _XATTR_UNSUPPORTED else None
+    
+    # Read all HyFS xattrs in one pass: missing keys cost no failing getxattr
+    if xattrs is None:
+        xattrs = _read_all_hyfs_xattrs(fpath, dev)
+    
     # Always try to ensure ctime is stored (valuable metadata)
-    ctime, _ = _ensure_xattr(path, 'ctime', lambda: str(path.stat().st_mtime))
+    ctime = xattrs.get('ctime')
+    if ctime is None:
+        ctime = str(_stat().st_mtime)
+        _set_xattr(fpath, 'ctime', ctime, dev=dev)
     
     # Try to get existing UUID
-    eid = _get_xattr(path, 'uuid')
+    eid = xattrs.get('uuid')
     if eid:
         return eid
     
@@ -147,51 +219,124 @@ def _compute_eid(path):
     new_uuid = str(uuid.uuid4())
     
     # Try to store it
-    if _set_xattr(path, 'uuid', new_uuid):
+    if _set_xattr(fpath, 'uuid', new_uuid, dev=dev):
         return new_uuid
     
     # Xattr not supported for UUID, fall back to deterministic hash
     # Use ctime (from xattr if available, else st_mtime from above)
-    s = path.stat()
+    s = _stat()
     data = f"{s.st_dev}:{s.st_ino}:{ctime}".encode()
     hash_hex = sha256(data).hexdigest()
     return f"{hash_hex[:8]}-{hash_hex[8:12]}-{hash_hex[12:16]}-{hash_hex[16:20]}-{hash_hex[20:32]}"
 
+EMPTY_SHA256 = sha256(b'').hexdigest()  # e3b0c442...b855
+_MMAP_MIN, _MMAP_MAX = 1 << 16, 1 << 31  # Size range (64KB-2GB) hashed through mmap
+
+def _hash_file(path, size=None):
+    """SHA256 hex digest of a file's content (releases the GIL while hashing).
+    Pass `size` when already known to skip the fstat."""
+    with open(path, 'rb') as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        # Mid-sized files: hash the mapped pages in one call, zero copies
+        if _MMAP_MIN <= size <= _MMAP_MAX:
+            try:
+                with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+                    if hasattr(mm, 'madvise'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)  # Aggressive readahead
+                    return sha256(mm).hexdigest()
+            except (OSError, ValueError):
+                pass  # Not mappable, stream it instead
+        # file_digest runs the read/update loop in C
+        if hasattr(hashlib, 'file_digest'):
+            h = hashlib.file_digest(f, 'sha256')
+        else:
+            h = sha256()
+            while chunk := f.read(1 << 20):  # 1MB chunks
+                h.update(chunk)
+    return h.hexdigest()
+
 def _compute_cid(path):
     """Compute SHA256 content hash for a file. Uses xattr cache if available."""
-    if not path.is_file():
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
         return None
     
     # Check for cached cid in xattr
-    cached_cid = _get_xattr(path, 'cid')
+    cached_cid = _get_xattr(path, 'cid', dev=st.st_dev)
     if cached_cid:
         return cached_cid
     
-    # Compute hash
-    h = sha256()
-    with open(path, 'rb') as f:
-        while chunk := f.read(65536):  # 64KB chunks
-            h.update(chunk)
-    
-    cid = h.hexdigest()
+    # Empty files all share the same hash, no need to open them
+    cid = EMPTY_SHA256 if st.st_size == 0 else _hash_file(path, st.st_size)
     
     # Try to cache it
-    _set_xattr(path, 'cid', cid)
+    _set_xattr(path, 'cid', cid, dev=st.st_dev)
     
     return cid
 
-def scan_fs(root_path, include_metadata=False):
-    """Scan filesystem and populate HyFS flat storage"""
+def _walk_subtree(top, recursive=True):
+    """Walk `top` with scandir (reuses dirent type, one stat per entry shared with eid computation).
+    Returns [(path, eid, is_dir, st, descend, cid)], parents before children (`cid` from xattr cache or None)."""
+    records = []
+    stack = [top]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            continue  # Unreadable directory, keep the node but skip its contents
+        for entry in entries:
+            path = dir_path / entry.name
+            is_dir = entry.is_dir()
+            try:
+                st = entry.stat()
+            except OSError:
+                # Dangling symlink: use the link's own stat for the ctime/hash eid fallback.
+                # An entry vanishing between scandir and here still raises and aborts the scan
+                st = entry.stat(follow_symlinks=False)
+            # Like rglob, don't descend into symlinked directories
+            descend = is_dir and not entry.is_symlink()
+            xattrs = _read_all_hyfs_xattrs(path, st.st_dev)
+            eid = _compute_eid(path, st, xattrs)
+            records.append((path, eid, is_dir, st, descend, xattrs.get('cid')))
+            if descend and recursive:
+                stack.append(path)
+    return records
+
+def scan_fs(root_path, include_metadata=False, workers=None):
+    """Scan filesystem and populate HyFS flat storage (subdirectories walked on a thread pool)"""
     hyfs = HyFS()
     root_path = Path(root_path)
     
-    # Walk the entire tree
-    for path in [root_path] + list(root_path.rglob('*')):
-        metadata = {}
-        if include_metadata:
-            # Add any metadata you want here
-            pass
-        hyfs.add_node(path, **metadata)
+    metadata = {}
+    if include_metadata:
+        # Add any metadata you want here
+        pass
+    
+    root_st = root_path.stat()
+    hyfs.add_node(root_path, st=root_st, **metadata)
+    if not stat.S_ISDIR(root_st.st_mode):
+        return hyfs
+    
+    # Top level inline, then one walk per subdirectory: scandir/stat/xattr syscalls release
+    # the GIL so walks overlap, and results are merged here (indexes need a single writer)
+    top = _walk_subtree(root_path, recursive=False)
+    subdirs = [path for path, _, _, _, descend, _ in top if descend]
+    if workers == 1 or len(subdirs) < 2:
+        subtrees = map(_walk_subtree, subdirs)  # Tiny root, not worth a pool
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            subtrees = list(ex.map(_walk_subtree, subdirs))
+    
+    for records in [top, *subtrees]:
+        for path, eid, is_dir, st, _, cid in records:
+            hyfs.add_node(path, eid=eid, is_dir=is_dir, st=st, **metadata)
+            if cid:
+                hyfs.nodes[eid]['cid'] = cid  # Read along with the eid, saves a lookup on `node.cid`
     
     return hyfs
 
@@ -207,30 +352,34 @@ FSNode.cid = cid
 
 @patch
 def show(self:FSNode, indent=0):
-    """Display tree node (works on tree view)"""
-    print('    ' * indent + self.path.name)
-    if 'children' in self:
-        for child in self.children:
-            child.show(indent+1)
+    """Display tree node (works on tree view, iterative so depth is unbounded)"""
+    stack = [(self, indent)]
+    while stack:
+        node, depth = stack.pop()
+        print('    ' * depth + _node_name(node))
+        # Reversed so children print in list order
+        stack.extend((child, depth+1) for child in reversed(node.get('children', ())))
 
 @patch
 def filter(self:FSNode, pred):
-    """Filter tree node recursively (works on tree view)"""
+    """Filter tree node and its descendants, pre-order (works on tree view, iterative so depth is unbounded)"""
     matches = L()
-    if pred(self): matches.append(self)
-    if 'children' in self:
-        for child in self.children:
-            matches += child.filter(pred)
+    stack = [self]
+    while stack:
+        node = stack.pop()
+        if pred(node): matches.append(node)
+        stack.extend(reversed(node.get('children', ())))
     return matches
 
 @patch
 def find(self:FSNode, pattern):
     """Find in tree node (works on tree view)"""
-    return self.filter(lambda n: fnmatch(n.path.name, pattern))
+    match = _glob_matcher(pattern)
+    return self.filter(lambda n: match(_node_name(n)))
 
 @patch
 def __repr__(self:FSNode):
-    name = self.path.name if hasattr(self, 'path') else 'unknown'
+    name = _node_name(self, 'unknown')
     type_icon = '📁' if self.get('type') == 'dir' else '📄'
     eid_short = self.eid[:8] if hasattr(self, 'eid') else 'no-eid'
     return f"FSNode({type_icon} {name!r}, {eid_short}...)"
@@ -241,17 +390,30 @@ def tag(self:HyFS, eid, tag):
     self.tags[tag].add(eid)
     self.eid_tags[eid].add(tag)
 
+@patch
+def bulk_tag(self:HyFS, eids, tag):
+    """Add a tag to many eids at once (idempotent)"""
+    eids = set(eids)
+    if not eids:
+        return
+    self.tags[tag].update(eids)  # Forward index in one C-level set update
+    for eid in eids:
+        self.eid_tags[eid].add(tag)
+
 @patch
 def untag(self:HyFS, eid, tag):
     """Remove a tag from an eid (idempotent)"""
-    self.tags[tag].discard(eid)
-    self.eid_tags[eid].discard(tag)
-    
-    # Clean up empty sets
-    if not self.tags[tag]:
-        del self.tags[tag]
-    if not self.eid_tags[eid]:
-        del self.eid_tags[eid]
+    # .get so a missing tag/eid doesn't auto-create an empty set; clean up emptied ones
+    eids = self.tags.get(tag)
+    if eids is not None:
+        eids.discard(eid)
+        if not eids:
+            del self.tags[tag]
+    tags = self.eid_tags.get(eid)
+    if tags is not None:
+        tags.discard(tag)
+        if not tags:
+            del self.eid_tags[eid]
 
 @patch
 def tagged(self:HyFS, tag):
@@ -264,18 +426,44 @@ def tags_of(self:HyFS, eid):
     return self.eid_tags[eid]  # Returns set (possibly empty)
 
 @patch
-def update_cids(self:L):
-    """Update cids for a list of nodes (chainable), recomputing from disk"""
-    for node in self:
-        if node.type == 'file':
-            # Clear node dict cache
-            if 'cid' in node:
-                del node['cid']
-            # Clear xattr cache to force recompute
-            try:
-                os.removexattr(str(node.path), 'user.hyfs.cid')
-            except OSError:
-                pass  # Wasn't set or xattr not supported
-            # Now access will recompute from file content
-            _ = node.cid
+def update_cids(self:L, workers=None):
+    """Update cids for a list of nodes (chainable), recomputing from disk in parallel"""
+    files = [node for node in self if node.type == 'file']
+    for node in files:
+        # Clear node dict cache
+        node.pop('cid', None)
+        # Clear xattr cache to force recompute (skipped on filesystems known to lack xattrs)
+        try:
+            dev = node.path.stat().st_dev if _XATTR_UNSUPPORTED else None
+        except OSError:
+            continue  # Gone or unreadable: _compute_cid below yields None
+        if dev in _XATTR_UNSUPPORTED:
+            continue
+        try:
+            os.removexattr(node.path, _XATTR_KEYS['cid'])
+        except OSError as e:
+            _xattr_failed(node.path, e)  # Wasn't set or xattr not supported
+    # Files are independent: hash them concurrently (hashlib releases the GIL).
+    # _compute_cid keeps its guards (non-regular/missing files -> None) and re-caches the xattr
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for node, cid in zip(files, ex.map(_compute_cid, [n.path for n in files])):
+            node['cid'] = cid
+    return self
+
+def _cid_of(path):
+    """Process pool worker: cid of the file at `path` (str, pickles cheaply)"""
+    return _compute_cid(Path(path))
+
+@patch
+def compute_all_cids(self:HyFS, workers=None, chunk=64):
+    """Compute all missing file cids on a process pool (uses every core), returns self for chaining"""
+    todo = [(eid, os.fspath(node.path)) for eid, node in self.nodes.items()
+            if node.type == 'file' and 'cid' not in node]
+    if not todo:
+        return self
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        # Workers check/fill the xattr cache themselves; results merged back here
+        cids = ex.map(_cid_of, [path for _, path in todo], chunksize=chunk)
+        for (eid, _), cid in zip(todo, cids):
+            self.nodes[eid]['cid'] = cid
     return self
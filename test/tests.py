@@ -102,15 +102,19 @@ filesystem = {
     "reports/002_report.txt": "Report 2\n",
 }
 
-# Create all files and directories
+# Create each directory once, shallowest first
+dirs = {(root / filepath).parent for filepath in filesystem}
+for d in sorted(dirs, key=lambda d: len(d.parts)):
+    d.mkdir(parents=True, exist_ok=True)
+
+# Create all files
 for filepath, content in filesystem.items():
-    full_path = root / filepath
-    full_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    if isinstance(content, bytes):
-        full_path.write_bytes(content)
-    else:
-        full_path.write_text(content)
+    data = content if isinstance(content, bytes) else content.encode()
+    fd = os.open(root / filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
 
 # Create a truly empty directory
 (root / "truly_empty").mkdir(exist_ok=True)
@@ -143,9 +147,8 @@ for node in py_files[:3]:
     hyfs.tag(node.eid, 'important')
     print(f"Tagged {node.path.name}")
 
-# Tag some as 'code'
-for node in py_files:
-    hyfs.tag(node.eid, 'code')
+# Tag all as 'code' in one go
+hyfs.bulk_tag(py_files.attrgot('eid'), 'code')
 
 # Tag a config file as 'important' too
 config = hyfs.find_by_path(root / 'config.json')
@@ -177,6 +180,13 @@ hyfs.untag(first_py.eid, 'important')
 print(f"\nAfter untag, {first_py.path.name} tags: {hyfs.tags_of(first_py.eid)}")
 print(f"Important count now: {len(hyfs.tagged('important'))}")
 
+# Untag of unknown tag/eid is a no-op and doesn't auto-create index entries
+tag_keys, eid_keys = set(hyfs.tags), set(hyfs.eid_tags)
+hyfs.untag(first_py.eid, 'no-such-tag')
+hyfs.untag('no-such-eid', 'code')
+assert set(hyfs.tags) == tag_keys and set(hyfs.eid_tags) == eid_keys
+print("Untag of unknown tag/eid left indexes untouched")
+
 # Show all tags
 print(f"\nAll tags in system: {list(hyfs.tags.keys())}")
 